@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the joint-space safety envelope of the arm controller.
+
+Measures the time to build the envelope from the world file and to validate
+single targets and 10k-point trajectories, which must fit well inside the
+16 ms simulation step of worlds/robotic_arm.wbt. It also cross-checks the
+table against exact collision checks at random configurations: no
+configuration the table marks safe may collide.
+
+Usage: python benchmark_safety.py [--runs N] [--points N] [--samples N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "controllers", "arm_controller"))
+
+import safety
+
+WORLD_FILE = os.path.join(SCRIPT_DIR, "worlds", "robotic_arm.wbt")
+
+# Simulation step of the world, in milliseconds
+STEP_MS = 16
+
+def time_ms(function, runs):
+    """Run function several times and return the timings in milliseconds"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(name, samples, target=None):
+    median = statistics.median(samples)
+    line = f"{name:<40} median {median:9.3f} ms   min {min(samples):9.3f} ms"
+    if target is not None:
+        line += f"   target {target} ms: {'PASS' if median < target else 'FAIL'}"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for the arm safety envelope")
+    parser.add_argument("--runs", type=int, default=20, help="Number of runs per measurement (default: 20)")
+    parser.add_argument("--points", type=int, default=10000, help="Trajectory length (default: 10000)")
+    parser.add_argument("--samples", type=int, default=200000,
+                        help="Random configurations for the cross-check (default: 200000)")
+    args = parser.parse_args()
+
+    build = time_ms(lambda: safety.SafetyEnvelope.from_world(WORLD_FILE), max(1, args.runs // 10))
+    envelope = safety.SafetyEnvelope.from_world(WORLD_FILE)
+    print(f"Envelope over {', '.join(envelope.joint_names)}: {'x'.join(map(str, envelope.shape))} cells, "
+          f"{envelope.safe.mean():.1%} safe")
+    report("build from world file", build)
+
+    # A smooth random trajectory through the joint space
+    rng = np.random.default_rng(0)
+    waypoints = rng.uniform(envelope.lower, envelope.upper, (10, len(envelope.joint_names)))
+    steps = np.linspace(0, len(waypoints) - 1, args.points)
+    trajectory = np.stack([np.interp(steps, np.arange(len(waypoints)), waypoints[:, j])
+                           for j in range(waypoints.shape[1])], axis=1)
+
+    report("single target", time_ms(lambda: envelope.is_safe(trajectory[0]), args.runs), STEP_MS)
+    report("segment between two targets",
+           time_ms(lambda: envelope.segment_is_safe(trajectory[0], trajectory[-1]), args.runs), STEP_MS)
+    report(f"trajectory of {args.points} points",
+           time_ms(lambda: envelope.check_trajectory(trajectory), args.runs), STEP_MS)
+
+    # Every configuration marked safe must be free of collisions
+    samples = rng.uniform(envelope.lower, envelope.upper, (args.samples, len(envelope.joint_names)))
+    marked_safe = envelope.check_trajectory(samples)
+    collides = envelope.collides(samples)
+    false_safe = int(np.sum(marked_safe & collides))
+    free = int(np.sum(~collides))
+    print(f"Cross-check of {args.samples} random configurations: {false_safe} marked safe but colliding, "
+          f"{np.sum(marked_safe) / max(free, 1):.1%} of the free ones marked safe: "
+          f"{'PASS' if false_safe == 0 else 'FAIL'}")
+    if false_safe:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
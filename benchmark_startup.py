@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Startup benchmark for voice_control.py and websocket_server.py.
+
+Measures the import time of both scripts and the time from launching them
+until the first command reaches the robot controller. A fake controller is
+started on a free local port in place of the Webots simulation.
+
+Usage: python benchmark_startup.py [--runs N]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Target for debug mode time-to-first-accepted-command, in milliseconds
+DEBUG_TARGET_MS = 200
+
+def free_port():
+    """Return a free TCP port on localhost"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class FakeController:
+    """Minimal stand-in for the CommandServer in arm_controller.py"""
+
+    def __init__(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen(1)
+        self.port = self.socket.getsockname()[1]
+        self.received = threading.Event()
+        self.received_at = None
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            with client:
+                data = client.recv(1024)
+                if data:
+                    json.loads(data.decode('utf-8'))
+                    client.sendall(b'Command received')
+                    if not self.received.is_set():
+                        self.received_at = time.perf_counter()
+                        self.received.set()
+
+    def close(self):
+        self.socket.close()
+
+def time_import(module):
+    """Time a fresh interpreter importing module, minus the bare interpreter startup"""
+    def run(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, check=True)
+        return time.perf_counter() - start
+
+    baseline = run("pass")
+    return (run(f"import {module}") - baseline) * 1000
+
+def time_voice_control_debug():
+    """Time from launch of voice_control.py --debug until the controller gets a command"""
+    controller = FakeController()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "voice_control.py", "--debug", "--port", str(controller.port)],
+        cwd=SCRIPT_DIR, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+    )
+    try:
+        proc.communicate(b"home\nexit\n", timeout=10)
+        if not controller.received.wait(10):
+            raise RuntimeError("voice_control.py did not send a command")
+        return (controller.received_at - start) * 1000
+    finally:
+        proc.kill()
+        proc.wait()
+        controller.close()
+
+def time_websocket_server():
+    """Time from launch of websocket_server.py until the controller gets a forwarded command"""
+    import asyncio
+    import websockets
+
+    controller = FakeController()
+    ws_port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "websocket_server.py", "--ws-host", "127.0.0.1",
+         "--ws-port", str(ws_port), "--robot-host", "127.0.0.1",
+         "--robot-port", str(controller.port)],
+        cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    async def send_first_command():
+        deadline = time.perf_counter() + 10
+        while True:
+            try:
+                async with websockets.connect(f"ws://127.0.0.1:{ws_port}") as ws:
+                    await ws.recv()  # Welcome message
+                    await ws.send(json.dumps({"action": "home"}))
+                    await ws.recv()
+                    return
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise
+                await asyncio.sleep(0.005)
+
+    try:
+        asyncio.run(send_first_command())
+        if not controller.received.wait(10):
+            raise RuntimeError("websocket_server.py did not forward a command")
+        return (controller.received_at - start) * 1000
+    finally:
+        proc.terminate()
+        proc.wait()
+        controller.close()
+
+def report(name, samples, target=None):
+    median = statistics.median(samples)
+    line = f"{name:<48} median {median:8.1f} ms   min {min(samples):8.1f} ms"
+    if target is not None:
+        line += f"   target {target} ms: {'PASS' if median < target else 'FAIL'}"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark for the voice control scripts")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per measurement (default: 5)")
+    args = parser.parse_args()
+
+    report("import voice_control", [time_import("voice_control") for _ in range(args.runs)])
+    report("voice_control --debug first command",
+           [time_voice_control_debug() for _ in range(args.runs)], DEBUG_TARGET_MS)
+
+    try:
+        import websockets
+    except ImportError:
+        print("websockets not installed, skipping websocket_server measurements")
+        return
+
+    report("import websocket_server", [time_import("websocket_server") for _ in range(args.runs)])
+    report("websocket_server first forwarded command",
+           [time_websocket_server() for _ in range(args.runs)])
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Controller for a voice-controlled robotic arm.
 
 from controller import Robot, Motor, PositionSensor
 import sys
+import os
 import socket
 import json
 import threading
@@ -135,35 +136,115 @@ MOTOR_LIMITS = {
     "motor3": {"min": -1.57, "max": 1.57},  # -90 to +90 degrees
 }
 
-# Function to move a motor by a relative amount and respect limits
-def move_motor_relative(motor, sensor, increment, motor_name):
-    current_pos = sensor.getValue()
-    target_pos = current_pos + increment
+# Motor velocity settings, in radians per second
+MOTOR_VELOCITIES = {
+    "motor1": 1.0,  # Slower rotation for base (horizontal)
+    "motor2": 0.8,  # Slower for vertical joints
+    "motor3": 0.8,  # Slower for vertical joints
+}
+
+# Joint-space safety envelope built from the link geometry in the world file.
+# It needs numpy; without it, or if the world file cannot be read, only the
+# per-joint limits above are applied.
+WORLD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "worlds", "robotic_arm.wbt")
+try:
+    import safety
+    envelope_start = time.time()
+    envelope = safety.SafetyEnvelope.from_world(WORLD_FILE)
+    print(f"[SAFETY] Envelope for {', '.join(envelope.joint_names)} built in {time.time() - envelope_start:.2f}s")
+except ImportError as e:
+    envelope = None
+    print(f"[SAFETY] Envelope disabled, {e}. Install numpy to enable it.")
+except Exception as e:
+    envelope = None
+    print(f"[SAFETY] Envelope disabled, could not build it from {WORLD_FILE}: {e!r}")
+
+# Motors and sensors for the joints covered by the safety envelope
+JOINT_MOTORS = {
+    "motor1": motor1,
+    "motor2": motor2,
+    "motor3": motor3,
+}
+JOINT_SENSORS = {
+    "motor1": position_sensor1,
+    "motor2": position_sensor2,
+    "motor3": position_sensor3,
+}
+
+# Last position sent to each joint, which it keeps moving to until it arrives
+commanded_positions = {"motor1": 0.0, "motor2": 0.0, "motor3": 0.0}
+
+# Send a joint to a position and remember it as that joint's target
+def set_joint_position(motor_name, position):
+    JOINT_MOTORS[motor_name].setPosition(position)
+    commanded_positions[motor_name] = position
+
+# Check a move of one or more joints against the safety envelope
+def is_move_safe(targets):
+    if envelope is None:
+        return True
     
-    # Apply limits
-    limits = MOTOR_LIMITS.get(motor_name, {"min": -float("inf"), "max": float("inf")})
+    # Joints without a new target keep moving to their last commanded position
+    current = [JOINT_SENSORS[name].getValue() for name in envelope.joint_names]
+    target = [targets.get(name, commanded_positions[name]) for name in envelope.joint_names]
+    velocities = [MOTOR_VELOCITIES[name] for name in envelope.joint_names]
+    if not envelope.in_range(target):
+        print(f"[SAFETY] Blocked move to {targets}: outside the joint stops of the world file")
+        return False
+    # Each motor runs at its own velocity, so the path bends where a joint arrives
+    if envelope.move_is_safe(current, target, velocities):
+        return True
+    
+    print(f"[SAFETY] Blocked move to {targets}: the arm would hit the base, table or floor")
+    return False
+
+# Function to clamp a motor target to its limits, using the tighter of
+# MOTOR_LIMITS and the joint stops covered by the safety envelope
+def apply_limits(target_pos, motor_name):
+    limits = dict(MOTOR_LIMITS.get(motor_name, {"min": -float("inf"), "max": float("inf")}))
+    if envelope is not None and motor_name in envelope.joint_names:
+        index = envelope.joint_names.index(motor_name)
+        limits["min"] = max(limits["min"], float(envelope.lower[index]))
+        limits["max"] = min(limits["max"], float(envelope.upper[index]))
     if target_pos < limits["min"]:
         target_pos = limits["min"]
         print(f"[LIMIT] {motor_name} reached minimum limit of {limits['min']}")
     elif target_pos > limits["max"]:
         target_pos = limits["max"]
         print(f"[LIMIT] {motor_name} reached maximum limit of {limits['max']}")
+    return target_pos
+
+# Function to move a motor by a relative amount and respect limits
+def move_motor_relative(motor, sensor, increment, motor_name):
+    current_pos = sensor.getValue()
+    target_pos = apply_limits(current_pos + increment, motor_name)
+    
+    if not is_move_safe({motor_name: target_pos}):
+        return current_pos
     
     print(f"[DEBUG] Moving {motor_name}: Current={current_pos:.2f}, Target={target_pos:.2f}, Increment={increment:.2f}")
-    motor.setPosition(target_pos)
+    set_joint_position(motor_name, target_pos)
     return target_pos
 
 # Function to more carefully handle vertical movements (up/down)
 def move_vertical(motor2, motor3, sensor2, sensor3, increment):
     # For vertical movement, ensure the motors move in a coordinated way
-    # First move motor2, then motor3 with a slightly smaller increment
-    # Move elbow joint (motor2) first
-    move_motor_relative(motor2, sensor2, increment, "motor2")
-    
     # Calculate a slightly different increment for motor3 to maintain smooth motion
     # This helps prevent the arm from trying to stretch or compress unnaturally
     m3_increment = increment * 0.9  # Slightly smaller increment for wrist joint
-    move_motor_relative(motor3, sensor3, m3_increment, "motor3")
+    m2_target = apply_limits(sensor2.getValue() + increment, "motor2")
+    m3_target = apply_limits(sensor3.getValue() + m3_increment, "motor3")
+    
+    # Both joints are checked together, as it is their combination that can
+    # drive the gripper into the base or the table
+    if not is_move_safe({"motor2": m2_target, "motor3": m3_target}):
+        return
+    
+    # Move elbow joint (motor2) first, then the wrist joint (motor3)
+    print(f"[DEBUG] Moving motor2: Current={sensor2.getValue():.2f}, Target={m2_target:.2f}, Increment={increment:.2f}")
+    set_joint_position("motor2", m2_target)
+    print(f"[DEBUG] Moving motor3: Current={sensor3.getValue():.2f}, Target={m3_target:.2f}, Increment={m3_increment:.2f}")
+    set_joint_position("motor3", m3_target)
 
 # Main control loop
 print("Robot controller started")
@@ -171,9 +252,9 @@ print("[CONFIG] Movement increments - Horizontal:", MOVEMENT_INCREMENT, "Vertica
 print("[CONFIG] Motor limits:", MOTOR_LIMITS)
 
 # Set motor velocities to improve smoothness
-motor1.setVelocity(1.0)  # Slower rotation for base (horizontal)
-motor2.setVelocity(0.8)  # Slower for vertical joints
-motor3.setVelocity(0.8)  # Slower for vertical joints
+motor1.setVelocity(MOTOR_VELOCITIES["motor1"])  # Slower rotation for base (horizontal)
+motor2.setVelocity(MOTOR_VELOCITIES["motor2"])  # Slower for vertical joints
+motor3.setVelocity(MOTOR_VELOCITIES["motor3"])  # Slower for vertical joints
 gripper_left.setVelocity(0.5)  # Set velocity for gripper motor
 gripper_right.setVelocity(0.5)  # Set velocity for gripper motor
 
@@ -212,16 +293,20 @@ while robot.step(timestep) != -1:
             elif action in positions:
                 position = positions[action]
                 print(f"[POSITION] Moving to '{action}' position: {position}")
-                if position['motor1'] is not None:
-                    motor1.setPosition(position['motor1'])
-                if position['motor2'] is not None:
-                    motor2.setPosition(position['motor2'])
-                if position['motor3'] is not None:
-                    motor3.setPosition(position['motor3'])
+                
+                # Only arm moves are checked, the gripper alone cannot collide
+                joint_targets = {name: position[name] for name in JOINT_SENSORS if position[name] is not None}
+                arm_blocked = bool(joint_targets) and not is_move_safe(joint_targets)
+                if not arm_blocked:
+                    for name, target in joint_targets.items():
+                        set_joint_position(name, target)
                 if position['gripper'] is not None:
                     print(f"[GRIPPER] Setting gripper to position: {position['gripper']}")
                     set_gripper_position(position['gripper'])
                     gripper_left_pos = gripper_left_sensor.getValue()
                     gripper_right_pos = gripper_right_sensor.getValue()
                     print(f"[GRIPPER] Current positions: left={gripper_left_pos:.4f}, right={gripper_right_pos:.4f}")
-                print(f"[POSITION] Completed move to position: {action}") 
\ No newline at end of file
+                if arm_blocked:
+                    print(f"[POSITION] Move to position '{action}' blocked, arm left in place")
+                else:
+                    print(f"[POSITION] Completed move to position: {action}") 
\ No newline at end of file
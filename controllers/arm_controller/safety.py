@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+
+"""
+Joint-space safety envelope for the robotic arm.
+
+The link geometry is read from the Webots world file and used to precompute a
+discretized table over the motor joint space, marking every cell in which the
+arm could hit its own base, another link, the table or the floor. Checking a
+target or a whole trajectory is then one table lookup per sample.
+"""
+
+import math
+import re
+
+import numpy as np
+
+# Default size of a table cell in radians
+DEFAULT_RESOLUTION = 0.05
+
+# Extra distance in metres kept between colliding bodies
+DEFAULT_CLEARANCE = 0.005
+
+# Number of joint configurations evaluated at once while building the table
+BUILD_CHUNK_SIZE = 8192
+
+# Smallest cell in metres used when covering a box with spheres
+MIN_COVER_CELL = 0.02
+
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]|[^\s{}\[\]"]+')
+_NUMBER_RE = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+# Nodes whose children are traversed with their own translation and rotation
+_GROUPING_NODES = ("Robot", "Solid", "Transform", "Pose", "Group")
+
+
+class _Node:
+    """A node of the world file with its fields"""
+
+    def __init__(self, type_name):
+        self.type = type_name
+        self.fields = {}
+
+
+class _WorldParser:
+    """Minimal parser for the VRML-like syntax of Webots .wbt files"""
+
+    def __init__(self, text):
+        self.tokens = []
+        for line in text.splitlines():
+            for token in _TOKEN_RE.findall(line):
+                if token.startswith("#"):
+                    break
+                self.tokens.append(token)
+        self.pos = 0
+        self.defs = {}
+
+    def peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of world file")
+        self.pos += 1
+        return token
+
+    def parse_world(self):
+        nodes = []
+        while self.peek() is not None:
+            if self.peek() == "IMPORTABLE":
+                self.next()
+            elif self.peek() == "EXTERNPROTO":
+                self.next()
+                self.next()
+            else:
+                nodes.append(self.parse_node())
+        return nodes
+
+    def at_node(self):
+        return self.peek() in ("DEF", "USE") or self.peek(1) == "{"
+
+    def parse_node(self):
+        token = self.next()
+        if token == "USE":
+            return self.defs[self.next()]
+
+        def_name = None
+        if token == "DEF":
+            def_name = self.next()
+            token = self.next()
+
+        node = _Node(token)
+        if self.next() != "{":
+            raise ValueError(f"Expected '{{' after {token}")
+        while self.peek() != "}":
+            name = self.next()
+            node.fields[name] = self.parse_value(name)
+        self.next()
+
+        if def_name:
+            self.defs[def_name] = node
+        return node
+
+    def parse_value(self, name):
+        if self.peek() == "[":
+            self.next()
+            items = []
+            while self.peek() != "]":
+                if self.at_node():
+                    items.append(self.parse_node())
+                else:
+                    items.append(self.parse_scalar(self.next()))
+            self.next()
+            return items
+
+        if self.at_node():
+            return self.parse_node()
+
+        values = []
+        while self.is_scalar(self.peek()):
+            values.append(self.parse_scalar(self.next()))
+        if not values:
+            raise ValueError(f"Missing value for field {name}")
+        return values[0] if len(values) == 1 else values
+
+    @staticmethod
+    def is_scalar(token):
+        if token is None:
+            return False
+        return token.startswith('"') or token in ("TRUE", "FALSE", "NULL") or bool(_NUMBER_RE.match(token))
+
+    @staticmethod
+    def parse_scalar(token):
+        if token.startswith('"'):
+            return token[1:-1]
+        if token in ("TRUE", "FALSE"):
+            return token == "TRUE"
+        if token == "NULL":
+            return None
+        return float(token)
+
+
+def _rotation_matrices(axis, angles):
+    """Rotation matrices about a unit axis for an array of angles, shape (N, 3, 3)"""
+    x, y, z = axis
+    k = np.array([[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]])
+    sin = np.sin(angles)[:, None, None]
+    cos = np.cos(angles)[:, None, None]
+    return np.eye(3) + sin * k + (1.0 - cos) * (k @ k)
+
+
+def _frame(translation=(0.0, 0.0, 0.0), rotation=(0.0, 0.0, 1.0, 0.0)):
+    """Homogeneous transform from a Webots translation and axis-angle rotation"""
+    axis = np.asarray(rotation[:3], dtype=float)
+    norm = np.linalg.norm(axis)
+    frame = np.eye(4)
+    if norm > 0:
+        frame[:3, :3] = _rotation_matrices(axis / norm, np.array([rotation[3]]))[0]
+    frame[:3, 3] = translation
+    return frame
+
+
+def _node_frame(node):
+    return _frame(node.fields.get("translation", (0.0, 0.0, 0.0)),
+                  node.fields.get("rotation", (0.0, 0.0, 1.0, 0.0)))
+
+
+class _Joint:
+    """A motorized hinge joint, with its axis and end point in the parent link frame"""
+
+    def __init__(self, name, parent, anchor, axis, end_frame, lower, upper):
+        self.name = name
+        self.parent = parent
+        self.anchor = anchor
+        self.axis = axis
+        self.end_frame = end_frame
+        self.lower = lower
+        self.upper = upper
+
+
+class _Primitive:
+    """A Box, Cylinder or Sphere attached to a link"""
+
+    def __init__(self, link, frame, geometry, inflate):
+        self.link = link
+        self.frame = frame
+        self.type = geometry.type
+        self.fields = geometry.fields
+        self.inflate = inflate
+
+    def sphere_cover(self):
+        """Centers in the link frame and radii of spheres enclosing the primitive"""
+        if self.type == "Sphere":
+            centers = np.zeros((1, 3))
+            radii = np.array([self.fields.get("radius", 1.0)])
+        elif self.type == "Box":
+            # One sphere per cell of a grid spanning the two largest sides, with
+            # cells about half as wide as the box is thick
+            size = np.asarray(self.fields.get("size", (0.1, 0.1, 0.1)), dtype=float)
+            thin = int(np.argmin(size))
+            counts = np.ceil(size / max(size[thin] / 2, MIN_COVER_CELL)).astype(int)
+            counts[thin] = 1
+            cell = size / counts
+            grids = [(np.arange(n) + 0.5) * c - side / 2 for n, c, side in zip(counts, cell, size)]
+            centers = np.stack(np.meshgrid(*grids, indexing="ij"), axis=-1).reshape(-1, 3)
+            radii = np.full(len(centers), 0.5 * np.linalg.norm(cell))
+        else:
+            # Cylinders are aligned with their local z axis
+            height = self.fields.get("height", 2.0)
+            radius = self.fields.get("radius", 1.0)
+            count = max(2, int(math.ceil(height / radius)) + 1)
+            centers = np.zeros((count, 3))
+            centers[:, 2] = np.linspace(-height / 2, height / 2, count)
+            radii = np.full(count, math.hypot(radius, height / (count - 1) / 2))
+
+        centers = centers @ self.frame[:3, :3].T + self.frame[:3, 3]
+        return centers, radii + self.inflate
+
+    def distance(self, points):
+        """Signed distance from points in the link frame to the primitive surface"""
+        local = (points - self.frame[:3, 3]) @ self.frame[:3, :3]
+        if self.type == "Sphere":
+            return np.linalg.norm(local, axis=-1) - self.fields.get("radius", 1.0) - self.inflate
+        if self.type == "Box":
+            half = np.asarray(self.fields.get("size", (0.1, 0.1, 0.1)), dtype=float) / 2
+            excess = np.abs(local) - half
+            outside = np.linalg.norm(np.maximum(excess, 0.0), axis=-1)
+            inside = np.minimum(excess.max(axis=-1), 0.0)
+            return outside + inside - self.inflate
+        radial = np.hypot(local[..., 0], local[..., 1]) - self.fields.get("radius", 1.0)
+        axial = np.abs(local[..., 2]) - self.fields.get("height", 2.0) / 2
+        return np.maximum(radial, axial) - self.inflate
+
+
+class _Plane:
+    """Half-space obstacle below a plane, such as the floor"""
+
+    def __init__(self, normal, offset):
+        self.normal = normal
+        self.offset = offset
+
+    def distance(self, points):
+        return points @ self.normal - self.offset
+
+
+def _collect(node, link, frame, inflate, joints, primitives):
+    """Walk the robot's node tree, recording joints and link primitives"""
+    if node.type == "Shape":
+        geometry = node.fields.get("geometry")
+        if geometry is not None and geometry.type in ("Box", "Cylinder", "Sphere"):
+            primitives.append(_Primitive(link, frame, geometry, inflate))
+        return
+
+    if node.type in ("HingeJoint", "SliderJoint"):
+        end = node.fields.get("endPoint")
+        if end is None:
+            return
+        params = node.fields.get("jointParameters")
+        params = params.fields if params is not None else {}
+        end_frame = frame @ _node_frame(end)
+        devices = node.fields.get("device", [])
+        motor = next((device for device in devices if device.type == "RotationalMotor"), None)
+
+        if node.type == "HingeJoint" and motor is not None:
+            axis = frame[:3, :3] @ np.asarray(params.get("axis", (1.0, 0.0, 0.0)), dtype=float)
+            anchor = frame[:3, :3] @ np.asarray(params.get("anchor", (0.0, 0.0, 0.0)), dtype=float) + frame[:3, 3]
+            lower = params.get("minStop", 0.0)
+            upper = params.get("maxStop", 0.0)
+            if lower >= upper:
+                lower, upper = -math.pi, math.pi
+            joints.append(_Joint(motor.fields.get("name", f"motor{len(joints) + 1}"), link,
+                                 anchor, axis / np.linalg.norm(axis), end_frame, lower, upper))
+            child_link, child_frame = len(joints), np.eye(4)
+        else:
+            # Sliders (the gripper fingers) are kept in place, grown by their travel
+            child_link, child_frame = link, end_frame
+            if node.type == "SliderJoint":
+                inflate += max(abs(params.get("minStop", 0.0)), abs(params.get("maxStop", 0.0)))
+
+        for child in end.fields.get("children", []):
+            _collect(child, child_link, child_frame, inflate, joints, primitives)
+        return
+
+    if node.type in _GROUPING_NODES:
+        frame = frame @ _node_frame(node)
+        for child in node.fields.get("children", []):
+            _collect(child, link, frame, inflate, joints, primitives)
+
+
+class SafetyEnvelope:
+    """
+    Precomputed collision table over the joint space of the arm.
+
+    Joint positions are given in the order of joint_names. Targets outside the
+    joint stops of the world file are always unsafe.
+    """
+
+    def __init__(self, joints, primitives, obstacles, resolution=DEFAULT_RESOLUTION,
+                 clearance=DEFAULT_CLEARANCE):
+        self.joints = joints
+        self.joint_names = tuple(joint.name for joint in joints)
+        self.lower = np.array([joint.lower for joint in joints])
+        self.upper = np.array([joint.upper for joint in joints])
+        self.shape = tuple(max(1, int(math.ceil((upper - lower) / resolution)))
+                           for lower, upper in zip(self.lower, self.upper))
+        self.cell_size = (self.upper - self.lower) / np.array(self.shape)
+        self.clearance = clearance
+
+        # The base shapes are fixed obstacles, like the table and the floor
+        self.obstacles = obstacles + [primitive for primitive in primitives if primitive.link == 0]
+        self._prepare_links(primitives)
+        self.safe = self._build_table()
+
+    @classmethod
+    def from_world(cls, path, resolution=DEFAULT_RESOLUTION, clearance=DEFAULT_CLEARANCE):
+        """Build the envelope for the first Robot in a Webots world file"""
+        with open(path, "r") as f:
+            nodes = _WorldParser(f.read()).parse_world()
+
+        robot = next((node for node in nodes if node.type == "Robot"), None)
+        if robot is None:
+            raise ValueError(f"No Robot found in {path}")
+
+        # Link geometry in the robot frame, link 0 being the fixed base
+        joints, primitives = [], []
+        for child in robot.fields.get("children", []):
+            _collect(child, 0, np.eye(4), 0.0, joints, primitives)
+        if not joints:
+            raise ValueError(f"Robot in {path} has no motorized hinge joints")
+
+        # The table is treated as a solid block from the floor to its top
+        world_to_robot = np.linalg.inv(_node_frame(robot))
+        obstacles = []
+        for node in nodes:
+            if node.type == "Table":
+                size = node.fields.get("size", (1.8, 1.0, 0.74))
+                box = _Node("Box")
+                box.fields["size"] = size
+                center = _node_frame(node) @ _frame((0.0, 0.0, size[2] / 2))
+                obstacles.append(_Primitive(0, world_to_robot @ center, box, 0.0))
+            elif node.type == "Floor":
+                floor = world_to_robot @ _node_frame(node)
+                normal = floor[:3, 2]
+                obstacles.append(_Plane(normal, normal @ floor[:3, 3]))
+
+        return cls(joints, primitives, obstacles, resolution, clearance)
+
+    def _chain(self, link):
+        """Indices of the joints between the base and a link"""
+        chain = []
+        while link != 0:
+            chain.insert(0, link - 1)
+            link = self.joints[link - 1].parent
+        return chain
+
+    def _prepare_links(self, primitives):
+        self.link_centers, self.link_radii = [], []
+        for link in range(len(self.joints) + 1):
+            covers = [primitive.sphere_cover() for primitive in primitives if primitive.link == link]
+            self.link_centers.append(np.concatenate([c for c, _ in covers]) if covers else np.zeros((0, 3)))
+            self.link_radii.append(np.concatenate([r for _, r in covers]) if covers else np.zeros(0))
+
+        # A configuration anywhere in a cell differs from the cell center by at
+        # most half a cell per joint, which moves a point by at most its distance
+        # to that joint's anchor times the angle. These bounds are kept per joint
+        # so each check only adds the ones for the joints it depends on.
+        zero_frames = self._forward_kinematics(np.zeros((1, len(self.joints))))
+        anchors = [(zero_frames[joint.parent][0] @ np.append(joint.anchor, 1.0))[:3]
+                   for joint in self.joints]
+        self.link_margins = []
+        for link, centers in enumerate(self.link_centers):
+            margins = np.zeros((len(centers), len(self.joints)))
+            if link != 0:
+                world = self._to_world(zero_frames[link], centers)[0]
+                reach = np.linalg.norm(world - anchors[link - 1], axis=-1)
+                for index in reversed(self._chain(link)):
+                    margins[:, index] = reach * self.cell_size[index] / 2
+                    parent_joint = self.joints[index].parent - 1
+                    if parent_joint >= 0:
+                        reach = reach + np.linalg.norm(anchors[index] - anchors[parent_joint])
+            self.link_margins.append(margins)
+
+    def _checks(self):
+        """Collision checks as (joints they depend on, links involved)"""
+        checks = []
+        links = range(1, len(self.joints) + 1)
+
+        # The base is mounted in the table top, so the links attached to it are
+        # never checked against the base, the table or the floor
+        for link in links:
+            if self.joints[link - 1].parent != 0:
+                checks.append((self._chain(link), (link,)))
+
+        # Pairs of links, skipping a link and its parent. Their relative pose
+        # only depends on the joints that are not shared by both chains.
+        for a in links:
+            for b in links:
+                if a < b and self.joints[b - 1].parent != a and self.joints[a - 1].parent != b:
+                    checks.append((sorted(set(self._chain(a)) ^ set(self._chain(b))), (a, b)))
+        return checks
+
+    @staticmethod
+    def _to_world(frames, centers):
+        return centers @ frames[:, :3, :3].transpose(0, 2, 1) + frames[:, None, :3, 3]
+
+    def _forward_kinematics(self, q):
+        """Link frames for joint configurations q of shape (N, J), each (N, 4, 4)"""
+        frames = [np.broadcast_to(np.eye(4), (len(q), 4, 4))]
+        for index, joint in enumerate(self.joints):
+            motion = np.zeros((len(q), 4, 4))
+            rotation = _rotation_matrices(joint.axis, q[:, index])
+            motion[:, :3, :3] = rotation
+            motion[:, :3, 3] = joint.anchor - rotation @ joint.anchor
+            motion[:, 3, 3] = 1.0
+            frames.append(frames[joint.parent] @ motion @ joint.end_frame)
+        return frames
+
+    def _spheres(self, link, joints):
+        """Sphere centers of a link and their radii grown by the cell margins"""
+        reach = self.link_radii[link] + self.link_margins[link][:, joints].sum(axis=1)
+        return self.link_centers[link], reach
+
+    def _obstacle_collisions(self, frames, link, joints):
+        centers, reach = self._spheres(link, joints)
+        reach = reach + self.clearance
+
+        # Spheres are only placed for configurations where the sphere bounding
+        # the whole link comes close to an obstacle
+        bound_center = centers.mean(axis=0)
+        bound_reach = np.max(np.linalg.norm(centers - bound_center, axis=1) + reach)
+        world_bound = self._to_world(frames[link], bound_center[None])[:, 0]
+
+        collides = np.zeros(len(frames[link]), dtype=bool)
+        for obstacle in self.obstacles:
+            near = np.flatnonzero(~collides & (obstacle.distance(world_bound) < bound_reach))
+            if len(near):
+                world = self._to_world(frames[link][near], centers)
+                collides[near] = np.any(obstacle.distance(world) < reach, axis=1)
+        return collides
+
+    def _pair_collisions(self, frames, a, b, joints):
+        centers_a, reach_a = self._spheres(a, joints)
+        centers_b, reach_b = self._spheres(b, joints)
+        world_a = self._to_world(frames[a], centers_a)
+        world_b = self._to_world(frames[b], centers_b)
+        gap = np.linalg.norm(world_a[:, :, None, :] - world_b[:, None, :, :], axis=-1)
+        return np.any(gap < reach_a[:, None] + reach_b[None, :] + self.clearance, axis=(1, 2))
+
+    def _build_table(self):
+        """Evaluate each check over the cells of the joints it depends on"""
+        safe = np.ones(self.shape, dtype=bool)
+        for joints, links in sorted(self._checks(), key=lambda check: len(check[0])):
+            shape = tuple(self.shape[j] for j in joints)
+            collides = np.zeros(int(np.prod(shape)), dtype=bool)
+
+            # Cells already ruled out by an earlier check are not evaluated again
+            others = tuple(j for j in range(len(self.joints)) if j not in joints)
+            pending = np.flatnonzero(np.any(safe, axis=others))
+            for start in range(0, len(pending), BUILD_CHUNK_SIZE):
+                index = pending[start:start + BUILD_CHUNK_SIZE]
+                cell = np.stack(np.unravel_index(index, shape), axis=1)
+                q = np.zeros((len(index), len(self.joints)))
+                q[:, joints] = self.lower[joints] + (cell + 0.5) * self.cell_size[joints]
+                frames = self._forward_kinematics(q)
+                if len(links) == 1:
+                    collides[index] = self._obstacle_collisions(frames, links[0], joints)
+                else:
+                    collides[index] = self._pair_collisions(frames, *links, joints)
+
+            # Spread the result over the joints the check does not depend on
+            view = [1] * len(self.joints)
+            for joint, count in zip(joints, shape):
+                view[joint] = count
+            safe &= ~collides.reshape(view)
+        return safe.ravel()
+
+    def _cells(self, q):
+        """Flat table index and in-range flag for joint configurations of shape (N, J)"""
+        in_range = np.all((q >= self.lower) & (q <= self.upper), axis=1)
+        cell = np.floor((q - self.lower) / self.cell_size)
+        cell = np.clip(np.nan_to_num(cell), 0, np.array(self.shape) - 1).astype(np.intp)
+        return np.ravel_multi_index(cell.T, self.shape), in_range
+
+    def check_trajectory(self, trajectory):
+        """Safety flag for each sample of a trajectory of shape (N, J)"""
+        q = np.atleast_2d(np.asarray(trajectory, dtype=float))
+        cells, in_range = self._cells(q)
+        return in_range & self.safe[cells]
+
+    def is_safe(self, target):
+        """Check a single joint target"""
+        return bool(self.check_trajectory(target)[0])
+
+    def trajectory_is_safe(self, trajectory):
+        """Check that every sample of a trajectory of shape (N, J) is safe"""
+        return bool(np.all(self.check_trajectory(trajectory)))
+
+    def in_range(self, target):
+        """Check that a joint target lies within the joint stops"""
+        q = np.asarray(target, dtype=float)
+        return bool(np.all((q >= self.lower) & (q <= self.upper)))
+
+    def _segment_samples(self, start, end):
+        """Samples of the straight move from start to end, one in every cell it crosses"""
+        delta = end - start
+
+        # Fractions of the move at which it crosses a cell boundary. One sample
+        # between each pair of consecutive crossings lands in each crossed cell.
+        crossings = [np.array([0.0, 1.0])]
+        for joint in np.flatnonzero(delta):
+            boundaries = self.lower[joint] + np.arange(self.shape[joint] + 1) * self.cell_size[joint]
+            fractions = (boundaries - start[joint]) / delta[joint]
+            crossings.append(fractions[(fractions > 0) & (fractions < 1)])
+        crossings = np.unique(np.concatenate(crossings))
+        fractions = np.sort(np.concatenate([crossings, (crossings[:-1] + crossings[1:]) / 2]))
+        return start + fractions[:, None] * delta
+
+    def path_is_safe(self, waypoints):
+        """
+        Check the piecewise straight joint-space path through waypoints of
+        shape (N, J) against every cell it crosses. Unsafe samples are only
+        ignored while the path is still in the cell it starts from, so that an
+        arm already in an unsafe cell can be moved out of it, but not through
+        another unsafe cell.
+        """
+        waypoints = np.atleast_2d(np.asarray(waypoints, dtype=float))
+        samples = np.concatenate([waypoints[:1]] + [self._segment_samples(start, end)
+                                                    for start, end in zip(waypoints[:-1], waypoints[1:])])
+        cells, in_range = self._cells(samples)
+        flags = in_range & self.safe[cells]
+        leaving = np.flatnonzero(cells != cells[0])
+        first_checked = leaving[0] if len(leaving) else len(cells)
+        return bool(flags[-1] and np.all(flags[first_checked:]))
+
+    def segment_is_safe(self, start, end):
+        """Check the straight joint-space move from start to end, see path_is_safe"""
+        return self.path_is_safe([start, end])
+
+    def move_is_safe(self, start, end, velocities):
+        """
+        Check the move from start to end when every joint runs at its own
+        constant velocity, as Webots position control does. The path is bent
+        at each point where a joint reaches its target.
+        """
+        start = np.asarray(start, dtype=float)
+        end = np.asarray(end, dtype=float)
+        velocities = np.asarray(velocities, dtype=float)
+        distance = np.abs(end - start)
+        arrivals = np.unique(np.concatenate([[0.0], distance / velocities]))
+        travelled = np.minimum(arrivals[:, None] * velocities, distance)
+        return self.path_is_safe(start + np.sign(end - start) * travelled)
+
+    def collides(self, q):
+        """
+        Exact collision flags for joint configurations q of shape (N, J), using
+        the link spheres without the cell margins. Much slower than a table
+        lookup; meant for checking the table.
+        """
+        q = np.atleast_2d(np.asarray(q, dtype=float))
+        collides = np.zeros(len(q), dtype=bool)
+        for start in range(0, len(q), BUILD_CHUNK_SIZE):
+            chunk = slice(start, start + BUILD_CHUNK_SIZE)
+            frames = self._forward_kinematics(q[chunk])
+            for _, links in self._checks():
+                if len(links) == 1:
+                    collides[chunk] |= self._obstacle_collisions(frames, links[0], [])
+                else:
+                    collides[chunk] |= self._pair_collisions(frames, *links, [])
+        return collides
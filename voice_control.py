@@ -17,24 +17,28 @@ import queue
 import subprocess
 import tempfile
 import argparse
-import speech_recognition as sr
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Voice control for robotic arm in Webots")
-parser.add_argument("--debug", action="store_true", help="Enable debug mode with text input")
-parser.add_argument("--host", default="localhost", help="Server host (default: localhost)")
-parser.add_argument("--port", type=int, default=65432, help="Server port (default: 65432)")
-args = parser.parse_args()
+# speech_recognition is imported lazily inside the recognition functions so that
+# debug (text input) mode starts without loading it.
 
-debug_mode = args.debug
-server_host = args.host
-server_port = args.port
+# Connection settings, overwritten from the command line in main()
+debug_mode = False
+server_host = "localhost"
+server_port = 65432
 
 # Commands that the system recognizes
 VALID_COMMANDS = [
     "home", "up", "down", "left", "right", "open", "close", "stop", "position"
 ]
 
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Voice control for robotic arm in Webots")
+    parser.add_argument("--debug", action="store_true", help="Enable debug mode with text input")
+    parser.add_argument("--host", default="localhost", help="Server host (default: localhost)")
+    parser.add_argument("--port", type=int, default=65432, help="Server port (default: 65432)")
+    return parser.parse_args(argv)
+
 def is_wsl():
     """Check if we're running under WSL"""
     if os.path.exists("/proc/version"):
@@ -103,6 +107,8 @@ def recognize_speech_wsl():
     if not audio_file:
         return None
     
+    import speech_recognition as sr
+    
     try:
         # Use speech_recognition to process the recorded audio
         r = sr.Recognizer()
@@ -125,6 +131,8 @@ def recognize_speech_wsl():
 
 def recognize_speech_native():
     """Recognize speech using native Python speech recognition"""
+    import speech_recognition as sr
+    
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
         print("Listening... Speak now.")
@@ -243,21 +251,18 @@ def voice_input_loop():
     except KeyboardInterrupt:
         print("Exiting voice control...")
 
-def main():
-    """Main function"""
-    print("Voice Control for Robotic Arm")
-    print(f"Connecting to Webots controller at {server_host}:{server_port}")
-    
+def check_voice_dependencies():
+    """Make sure the modules needed for voice input are installed"""
     # Check if speech_recognition is installed
     try:
-        import speech_recognition as sr
+        import speech_recognition
     except ImportError:
         print("Error: speech_recognition module not found.")
         print("Please install it using: pip install SpeechRecognition")
         sys.exit(1)
     
     # Check if PyAudio is installed (needed for Microphone)
-    if not debug_mode and not is_wsl():
+    if not is_wsl():
         try:
             import pyaudio
         except ImportError:
@@ -266,11 +271,25 @@ def main():
             print("On Linux, you might need: sudo apt-get install python3-pyaudio")
             print("On Windows, you might need Microsoft Visual C++ 14.0 or greater")
             sys.exit(1)
+
+def main(argv=None):
+    """Main function"""
+    global debug_mode, server_host, server_port
+    
+    args = parse_args(argv)
+    debug_mode = args.debug
+    server_host = args.host
+    server_port = args.port
+    
+    print("Voice Control for Robotic Arm")
+    print(f"Connecting to Webots controller at {server_host}:{server_port}")
     
-    # Run the appropriate input loop
+    # Run the appropriate input loop. Debug mode only needs the socket client,
+    # so the speech modules are neither checked nor imported there.
     if debug_mode:
         debug_input_loop()
     else:
+        check_voice_dependencies()
         voice_input_loop()
 
 if __name__ == "__main__":
@@ -14,35 +14,46 @@ import socket
 import argparse
 import logging
 import sys
-import platform
-import os
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger("WebsocketServer")
+import threading
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Websocket server for robotic arm control")
-parser.add_argument("--ws-host", default="0.0.0.0", help="Websocket host (default: 0.0.0.0)")
-parser.add_argument("--ws-port", type=int, default=8765, help="Websocket port (default: 8765)")
-parser.add_argument("--robot-host", default="localhost", help="Robot controller host (default: localhost)")
-parser.add_argument("--robot-port", type=int, default=65432, help="Robot controller port (default: 65432)")
-parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
-args = parser.parse_args()
+logger = logging.getLogger("WebsocketServer")
 
-# Set log level based on verbosity
-if args.verbose:
-    logging.getLogger().setLevel(logging.DEBUG)
-    logger.setLevel(logging.DEBUG)
+# Command line arguments, set in main() before the server starts
+args = None
 
 # Global variables
 CLIENTS = set()
 
-def get_ip_addresses():
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Websocket server for robotic arm control")
+    parser.add_argument("--ws-host", default="0.0.0.0", help="Websocket host (default: 0.0.0.0)")
+    parser.add_argument("--ws-port", type=int, default=8765, help="Websocket port (default: 8765)")
+    parser.add_argument("--robot-host", default="localhost", help="Robot controller host (default: localhost)")
+    parser.add_argument("--robot-port", type=int, default=65432, help="Robot controller port (default: 65432)")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument("--no-diagnostics", action="store_true", help="Skip the startup network diagnostics")
+    parser.add_argument("--diagnostics-timeout", type=float, default=2.0,
+                        help="Time limit in seconds for each startup diagnostic (default: 2.0)")
+    return parser.parse_args(argv)
+
+def configure_logging(verbose):
+    """Configure logging, with debug output if verbose is set"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    # Set log level based on verbosity
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+        logger.setLevel(logging.DEBUG)
+
+def get_ip_addresses(timeout=2.0):
     """Get all IP addresses of this machine to help with debugging"""
+    import platform
+    import subprocess
+    
     ip_addresses = []
     try:
         # Get hostname
@@ -59,14 +70,16 @@ def get_ip_addresses():
         # Get all network interfaces
         if platform.system() == "Windows":
             # On Windows
-            ip_config = os.popen('ipconfig').read()
+            ip_config = subprocess.run('ipconfig', shell=True, capture_output=True,
+                                       text=True, timeout=timeout).stdout
             ip_addresses.append("Network interfaces:")
             for line in ip_config.split('\n'):
                 if "IPv4 Address" in line:
                     ip_addresses.append(f"  {line.strip()}")
         else:
             # On Linux/Mac
-            if_config = os.popen('ifconfig || ip addr').read()
+            if_config = subprocess.run('ifconfig || ip addr', shell=True, capture_output=True,
+                                       text=True, timeout=timeout).stdout
             ip_addresses.append("Network interfaces:")
             for line in if_config.split('\n'):
                 if "inet " in line and "127.0.0.1" not in line:
@@ -76,6 +89,74 @@ def get_ip_addresses():
     
     return ip_addresses
 
+def run_in_daemon_thread(function, *func_args):
+    """
+    Run a blocking function in a daemon thread and return a future for its result.
+    The thread is fire-and-forget: if it hangs (e.g. in a DNS lookup) nothing
+    waits for it, so it cannot hold up server shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_exception(error):
+        if not future.done():
+            future.set_exception(error)
+
+    def worker():
+        try:
+            result = function(*func_args)
+        except Exception as e:
+            callback, value = set_exception, e
+        else:
+            callback, value = set_result, result
+        try:
+            loop.call_soon_threadsafe(callback, value)
+        except RuntimeError:
+            pass  # The event loop is already closed
+
+    threading.Thread(target=worker, daemon=True).start()
+    return future
+
+async def log_ip_addresses(timeout):
+    """Log the IP address information, giving up after timeout seconds"""
+    try:
+        ip_addresses = await asyncio.wait_for(run_in_daemon_thread(get_ip_addresses, timeout), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"IP address lookup did not finish within {timeout}s, skipped")
+        return
+    
+    # Print IP address information to help with connection
+    logger.info("Server IP Address Information:")
+    for ip_info in ip_addresses:
+        logger.info(f"  {ip_info}")
+
+async def check_robot_reachable(timeout):
+    """Check if the robot controller is reachable, giving up after timeout seconds"""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(args.robot_host, args.robot_port), timeout)
+        writer.close()
+        logger.info(f"Robot controller is reachable at {args.robot_host}:{args.robot_port}")
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.warning(f"Robot controller is not reachable: {e!r}")
+        logger.warning("Voice commands will be received but may not be forwarded to the robot")
+        logger.warning("Make sure the Webots simulation is running")
+
+async def run_startup_diagnostics(timeout):
+    """Run the startup diagnostics concurrently once the server is accepting connections"""
+    results = await asyncio.gather(
+        log_ip_addresses(timeout),
+        check_robot_reachable(timeout),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Startup diagnostic failed: {result}")
+
 async def send_to_robot(command_dict):
     """Send a command to the Webots controller via socket"""
     try:
@@ -124,42 +205,18 @@ async def handle_client(websocket):
         if websocket in CLIENTS:
             CLIENTS.remove(websocket)
 
-async def main():
-    """Main function"""
+async def serve():
+    """Run the websocket server until cancelled"""
     # Print diagnostic information
     logger.info("=== Websocket Server for Robotic Arm Control ===")
-    
-    # Print IP address information to help with connection
-    ip_addresses = get_ip_addresses()
-    logger.info("Server IP Address Information:")
-    for ip_info in ip_addresses:
-        logger.info(f"  {ip_info}")
-    
-    # Check if port is already in use
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(2)
-    result = sock.connect_ex((args.ws_host if args.ws_host != "0.0.0.0" else "127.0.0.1", args.ws_port))
-    if result == 0:
-        logger.warning(f"Port {args.ws_port} is already in use! This might cause issues.")
-    sock.close()
 
     # Start the server
     logger.info(f"Starting websocket server on {args.ws_host}:{args.ws_port}")
     logger.info(f"Will forward commands to robot at {args.robot_host}:{args.robot_port}")
     logger.info("Use Ctrl+C to stop the server")
-    
-    # Check if robot controller is reachable
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(2)
-            s.connect((args.robot_host, args.robot_port))
-            logger.info(f"Robot controller is reachable at {args.robot_host}:{args.robot_port}")
-    except Exception as e:
-        logger.warning(f"Robot controller is not reachable: {e}")
-        logger.warning("Voice commands will be received but may not be forwarded to the robot")
-        logger.warning("Make sure the Webots simulation is running")
 
     # Start the websocket server
+    diagnostics = None
     try:
         async with websockets.serve(
             handle_client, 
@@ -169,18 +226,34 @@ async def main():
             ping_timeout=10
         ):
             logger.info("Server started successfully!")
+            
+            # Diagnostics run in the background so they never delay serving
+            if not args.no_diagnostics:
+                diagnostics = asyncio.create_task(run_startup_diagnostics(args.diagnostics_timeout))
+            
             await asyncio.Future()  # Run forever
     except OSError as e:
         logger.error(f"Failed to start server: {e}")
         if "Address already in use" in str(e):
             logger.error(f"Port {args.ws_port} is already in use. Try a different port.")
         sys.exit(1)
+    finally:
+        if diagnostics is not None:
+            diagnostics.cancel()
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Main function"""
+    global args
+    
+    args = parse_args(argv)
+    configure_logging(args.verbose)
     try:
-        asyncio.run(main())
+        asyncio.run(serve())
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file